@@ -5,12 +5,14 @@ Which takes a list of tokens and converts it into a feature matrix (a pandas Dat
 That can be fed into the decision tree
 """
 
+import numpy as np
 import pandas as pd
 import re
+from functools import lru_cache
 from typing import List
 
 # Lists of 100% correct words, that are regularly used
-ENG_WORDS = {
+ENG_WORDS = frozenset({
     'a', 'an', 'the', 'is', 'are', 'was', 'were', 'he', 'she', 'it', 'they',
     'you', 'we', 'i', 'my', 'your', 'his', 'her', 'its', 'our', 'their',
     'in', 'on', 'at', 'of', 'to', 'for', 'with', 'by', 'from', 'and', 'but', 'or',
@@ -21,9 +23,9 @@ ENG_WORDS = {
     'about', 'after', 'before', 'down', 'out', 'over', 'up', 'under', 'through',
     'not', 'no', 'yes', 'all', 'any', 'some', 'very', 'just', 'now',
     'here', 'there', 'why', 'how', 'what', 'which', 'who', 'whom'
-}
+})
 
-FIL_WORDS = {
+FIL_WORDS = frozenset({
     'ang', 'mga', 'sa', 'ng', 'na', 'pa', 'ba', 'ay', 'si', 'ni', 'kay', 'kina',
     'ako', 'ikaw', 'siya', 'tayo', 'kami', 'sila', 'ito', 'iyan', 'iyon',
     'ko', 'mo', 'niya', 'namin', 'nila', 'atin', 'inyo', 'at', 'o', 'pero', 'hindi',
@@ -32,23 +34,110 @@ FIL_WORDS = {
     'kayo', 'kanila', 'kaniya', 'dito', 'diyan', 'doon', 'nito', 'niyan', 'niyon',
     'kaya', 'para', 'dahil', 'habang', 'kapag', 'kung', 'saka',
     'may', 'meron', 'wala', 'dapat', 'talaga', 'mismo'
+})
+
+"""
+Maps every known word to its language, so a token only needs one lookup
+Words in both lists ('at', 'may') are labeled as English, so ENG_WORDS is added last
+"""
+WORD_TO_LANGUAGE = {word: "FIL" for word in FIL_WORDS}
+WORD_TO_LANGUAGE.update({word: "ENG" for word in ENG_WORDS})
+
+# Letters that are mostly found in English or borrowed words, and the vowels
+LOAN_LETTERS = frozenset('cfjqvxz')
+VOWELS = frozenset('aeiou')
+
+# Symbols that end a sentence, the token after one of these is not mid-sentence
+SENTENCE_ENDERS = ['.', '!', '?']
+
+# Words that float() accepts even without a digit
+FLOAT_WORDS = frozenset(['nan', 'inf', 'infinity'])
+
+# Regular expressions used by the feature functions, compiled once when the module is loaded
+_RE_DIGIT = re.compile(r'\d')                            # any digit
+_RE_SYMBOL = re.compile(r'[\W_]+')                       # only symbols and '_'
+_RE_PAIR_DUPE = re.compile(r'([a-z]{2})\1')              # 2 letters repeated in succession
+_RE_VOWEL_DUPE = re.compile(r'([aeiou])\1')              # a vowel repeated in succession
+_RE_CONSONANT_CLUSTER = re.compile(r'[^aeiou\d\W_]{3,}') # 3 or more consonants in a row
+
+"""
+Filipino prefixes, grouped by width and checked from the widest to the narrowest
+Each width is only checked if the token is longer than it
+Prefixes in the same width can never overlap, so one dictionary lookup per width is enough
+"""
+FIL_PREFIXES = [
+    (4, {
+        'maki': 'MAKI',   # makikain, makisali, makipaglaro
+        'paki': 'PAKI',   # pakibasa, pakisabi, pakisama
+        'naki': 'NAKI',   # nakisakay, nakiinom, nakisama
+        'pala': 'PALA',   # palangiti, palabiro, palatawa
+        'mala': 'MALA',   # malahayop, malaibon, malaanghel
+        'pang': 'PANG',   # pangkamay, pangligo, pang-abay
+    }),
+    (3, {
+        'mag': 'MAG',     # magluto, magtatanim, maglilinis
+        'nag': 'NAG',     # nagbayad, naglalaba, nagsasayaw
+        'pag': 'PAG',     # pagkain, pagpunta, pag-aaral
+    }),
+    (2, {
+        'um': 'UM',       # umalis, umiyak
+        'in': 'IN',       # inilagay, inabot
+        'ni': 'NI',       # niluto, nilinis, nilakad
+        'ma': 'MA',       # malakas, maganda, maingay
+        'pa': 'PA',       # paalis, pakain, papunta
+        'na': 'NA',       # natapon, nabasa, nabasag
+        'ng': 'NG',       # ngunit, ngiti, ngayon
+    }),
+]
+
+# Prefixes that only count if the letter right after them is one of these
+FIL_PREFIX_NEXT_LETTERS = {
+    'um': VOWELS,
+    'in': VOWELS,
+    'ni': frozenset('l'),
 }
 
-def f_get_language(token):
+"""
+English suffixes, grouped by width and checked from the widest to the narrowest
+Each width is only checked if the token is longer than it
+Suffixes in the same width can never overlap, so one dictionary lookup per width is enough
+'es' is in the 2 width group, so it is always matched before 's'
+"""
+ENG_SUFFIXES = [
+    (4, {
+        'tion': 'TION',   # action, motion, emotion
+        'sion': 'SION',   # precision, confusion, vision
+        'ment': 'MENT',   # moment, payment, contentment
+        'ness': 'NESS',   # happiness, kindness, darkness
+        'able': 'ABLE',   # reachable, comfortable, doable
+        'ible': 'IBLE',   # visible, terrible, flexible
+        'less': 'LESS',   # hopeless, useless, careless
+    }),
+    (3, {
+        'ing': 'ING',     # walking, talking, coding
+        'ful': 'FUL',     # beautiful, wonderful, painful
+        'ity': 'ITY',     # ability, flexibility, city
+        'est': 'EST',     # biggest, fastest, strongest
+    }),
+    (2, {
+        'es': 'ES',       # boxes, wishes, goes
+        'ed': 'ED',       # walked, talked, coded
+        'er': 'ER',       # teacher, worker, faster
+        'ly': 'LY',       # quickly, slowly, happily
+    }),
+    (1, {
+        's': 'S',         # cats, dogs, runs
+        'y': 'Y',         # happy, sleepy, party
+    }),
+]
+
+def f_get_language(token_str, token_lower, t_len):
     """
     Checks if a token is an English word, a Filipino word, or NONE of the above.
     """
-    # Convert to string and lowercase it once
-    token_lower = str(token).lower()
-
-    if token_lower in ENG_WORDS:
-        return "ENG"
-    if token_lower in FIL_WORDS:
-        return "FIL"
+    return WORD_TO_LANGUAGE.get(token_lower, "NONE")
 
-    return "NONE"
-
-def f_oth_filter(token):
+def f_oth_filter(token_str, token_lower, t_len):
     """
     Filters tokens with OTH characteristics:
         Numeric
@@ -56,90 +145,93 @@ def f_oth_filter(token):
         Laughter
         Abbreviations
     """
-    token_str = str(token)
 
     """
         Remove all the commas in the token
-        Try to convert the cleaned token into a float
+        A float always has a digit, unless it is 'nan', 'inf' or 'infinity'
+        If the cleaned token could be a float, try to convert it into a float
         If it works
             return "NUMERIC"
         If it does not work
             pass
+        Most tokens are words, so this skips raising and catching an error for each of them
         EX: 100,000.00 -> 100000.00 (success), 10 -> 10 (success),
-            Hello -> Hello (error), . -> . (error)
+            Hello -> Hello (skipped), 1st -> 1st (error)
     """
     cleaned_str = token_str.replace(",", "")
-    try:
-        float(cleaned_str)
-        return "NUMERIC"
-    except ValueError:
-        pass
+    if _RE_DIGIT.search(cleaned_str) or cleaned_str.strip().lstrip('+-').lower() in FLOAT_WORDS:
+        try:
+            float(cleaned_str)
+            return "NUMERIC"
+        except ValueError:
+            pass
 
     """
         If token is just punctuation or symbols
             return "SYMBOL"
         The 'backslash W' means all symbols except '_', '_' is added for comparison
     """
-    if re.fullmatch(r'[\W_]+', token_str):
+    if _RE_SYMBOL.fullmatch(token_str):
         return "SYMBOL"
 
     """
         If 'haha' or 'hehe' exists in the token
             return "LAUGHTER"
     """
-    token_lower = token_str.lower()
     if 'haha' in token_lower or 'hehe' in token_lower:
         return "LAUGHTER"
 
     """
-        If the token is mane of letters and is fully capitalized
+        If the token is fully capitalized and has letters in it
             return "ABB"
+        isupper() is checked first, since it is a single call and is false for most tokens
     """
-    if any(c.isalpha() for c in token_str) and token_str.isupper():
+    if token_str.isupper() and any(c.isalpha() for c in token_str):
         return "ABB"
 
     return "REGULAR"
 
-def f_has_pair_vowel_word_duplication (token):
+def f_has_pair_vowel_word_duplication(token_str, token_lower, t_len):
     """
     Filters tokens with FIL characteristics:
         Word duplication
         Pair duplication
         Vowel duplication
     """
-    token_str = str(token).lower()
 
     """
-        The token is first split on the '-' if applicable
+        If the token contains a '-', it is split on the '-'
 
         If parts is split into 2, and both parts the same
             return "WORD_dupe"
             EX: araw-araw, sino-sino, etc.
     """
-    parts = token_str.split('-')
-    if len(parts) == 2 and parts[0] == parts[1]:
-        return "WORD_dupe"
+    if '-' in token_lower:
+        parts = token_lower.split('-')
+        if len(parts) == 2 and parts[0] == parts[1]:
+            return "WORD_dupe"
 
     """
         If there is a group of 2 letters that repeat in succession
             return "PAIR_dupe"
             EX: tatakbo, nagtatanim, etc.
+        Only tokens with at least 4 letters can have a repeated pair
     """
-    if re.search(r'([a-z]{2})\1', token_str):
+    if t_len > 3 and _RE_PAIR_DUPE.search(token_lower):
         return "PAIR_dupe"
 
     """
         If there is a vowel that repeats in succession
             return "VOWEL_dupe"
             EX: umiiyak, nag-aaral, etc.
+        Only tokens with at least 2 letters can have a repeated vowel
     """
-    token_str = str(token).lower()
-    if re.search(r'([aeiou])\1', token_str):
+    if t_len > 1 and _RE_VOWEL_DUPE.search(token_lower):
         return "VOWEL_dupe"
 
     return "NO_dupe"
 
-def f_prefix_fil(token):
+def f_prefix_fil(token_str, token_lower, t_len):
     """
     Filters tokens with FIL prefix characteristics:
         maki-
@@ -159,163 +251,46 @@ def f_prefix_fil(token):
         na-
         ng-
     """
-    token_str = str(token).lower()
-    t_len = len(token_str)
-
-    # Filter for 4 width prefix
-    if t_len > 4:
-        """
-            If token starts with 'maki'
-                return "MAKI"
-                EX: makikain, makisali, makipaglaro, etc.
-        """
-        if token_str.startswith('maki'):
-            return "MAKI"
-
-        """
-            If token starts with 'paki'
-                return "PAKI"
-                EX: pakibasa, pakisabi, pakisama, etc.
-        """
-        if token_str.startswith('paki'):
-            return "PAKI"
-
-        """
-            If token starts with 'naki'
-                return "NAKI"
-                EX: nakisakay, nakiinom, nakisama, etc.
-        """
-        if token_str.startswith('naki'):
-            return "NAKI"
-
-        """
-            If token starts with 'pala'
-                return "PALA"
-                EX: palangiti, palabiro, palatawa, etc.
-        """
-        if token_str.startswith('pala'):
-            return "PALA"
-
-        """
-            If token starts with 'mala'
-                return "MALA"
-                EX: malahayop, malaibon, malaanghel, etc.
-        """
-        if token_str.startswith('mala'):
-            return "MALA"
-
-        """
-            If token starts with 'pang'
-                return "PANG"
-                EX: pangkamay, pangligo, pang-abay, etc.
-        """
-        if token_str.startswith('pang'):
-            return "PANG"
-
-    # Filter for 3 width prefix
-    if t_len > 3:
-        """
-            If token starts with 'mag'
-                return "MAG"
-                EX: magluto, magtatanim, maglilinis, etc.
-        """
-        if token_str.startswith('mag'):
-            return "MAG"
-
-        """
-            If token starts with 'nag'
-                return "NAG"
-                EX: nagbayad, naglalaba, nagsasayaw, etc.
-        """
-        if token_str.startswith('nag'):
-            return "NAG"
-
-        """
-            If token starts with 'pag'
-                return "PAG"
-                EX: pagkain, pagpunta, pag-aaral, etc.
-        """
-        if token_str.startswith('pag'):
-            return "PAG"
-
-    # Filter for 2 width prefix
-    if t_len > 2:
-        """
-            If token starts with 'um' and the third letter is a vowel
-                return "UM"
-                EX: umalis, umiyak, etc.
-        """
-        if token_str.startswith('um') and token_str[2] in 'aeiou':
-            return "UM"
-
-        """
-            If token starts with 'in' and the third letter is a vowel
-                return "IN"
-                EX: inilagay, inabot, etc.
-        """
-        if token_str.startswith('in') and token_str[2] in 'aeiou':
-            return "IN"
 
-        """
-            If token starts with 'ni' and the third letter is 'l'
-                return "NI"
-                EX: niluto, nilinis, nilakad, etc.
-        """
-        if token_str.startswith('ni') and token_str[2] == 'l':
-            return "NI"
-
-        """
-            If token starts with 'ma'
-                return "MA"
-                EX: malakas, maganda, maingay, etc.
-        """
-        if token_str.startswith('ma'):
-            return "MA"
-
-        """
-            If token starts with 'pa'
-                return "PA"
-                EX: paalis, pakain, papunta, etc.
-        """
-        if token_str.startswith('pa'):
-            return "PA"
-
-        """
-            If token starts with 'na'
-                return "NA"
-                EX: natapon, nabasa, nabasag, etc.
-        """
-        if token_str.startswith('na'):
-            return "NA"
-
-        """
-            If the token starts with 'ng'
-                return "NG"
-                EX: ngunit, ngiti, ngayon, etc.
-        """
-        if token_str.startswith('ng'):
-            return "NG"
+    """
+        For every prefix width in FIL_PREFIXES, from the widest to the narrowest
+        If the token is longer than the width
+            Take the first 'width' letters of the token and look them up in the table
+            If they are a known prefix, and the letter after it is allowed (FIL_PREFIX_NEXT_LETTERS)
+                return its label
+        EX: nagbayad -> 'nagb' (not found), 'nag' (found) -> "NAG"
+            umalis -> 'umal' (not found), 'uma' (not found), 'um' (found, 'a' is a vowel) -> "UM"
+    """
+    for width, prefixes in FIL_PREFIXES:
+        if t_len > width:
+            prefix = token_lower[:width]
+            label = prefixes.get(prefix)
+            if label is not None:
+                next_letters = FIL_PREFIX_NEXT_LETTERS.get(prefix)
+                if next_letters is None or token_lower[width] in next_letters:
+                    return label
 
     return "NONE"
 
-def f_infix_fil(token):
+def f_infix_fil(token_str, token_lower, t_len):
     """
     Filters tokens with FIL infix characteristics:
         -in-
         -um-
         -ng-
     """
-    token_str = str(token).lower()
-    t_len = len(token_str)
 
     # If token starts with a vowel and its length is more than 3
-    if token_str[0] not in 'aeiou' and t_len > 3:
+    if token_lower[0] not in 'aeiou' and t_len > 3:
+        # The 2nd-3rd letters are sliced once for both infix checks
+        infix = token_lower[1:3]
+
         """
             If the token starts with a consonant and contains 'in' in the 2nd-3rd letter
                 return "IN"
                 EX: kinain, tinanim, pinalo etc.
         """
-        if token_str[1:3] == 'in':
+        if infix == 'in':
             return "IN"
 
         """
@@ -323,7 +298,7 @@ def f_infix_fil(token):
                 return "UM"
                 EX: pumunta, kumuha, tumawa etc.
         """
-        if token_str[1:3] == 'um':
+        if infix == 'um':
             return "UM"
 
     # If token is longer than 3
@@ -333,27 +308,26 @@ def f_infix_fil(token):
                 return "NG"
                 EX: pangalan, malungkot, mangga, etc.
         """
-        if 'ng' in token_str[1:-1]:
+        if 'ng' in token_lower[1:-1]:
             return "NG"
 
     return "NONE"
 
-def f_suffix_fil(tokens):
+def f_suffix_fil(token_str, token_lower, t_len):
     """
     Filters tokens with FIL suffix characteristics:
         -in
         -an
     """
-    token_str = str(tokens).lower()
 
     # If token is bigger than 3 and 3rd to the last letter is 'u' or a consonant
-    if len(token_str) > 3 and (token_str[-3] == 'u' or token_str[-3] not in 'aeio'):
+    if t_len > 3 and (token_lower[-3] == 'u' or token_lower[-3] not in 'aeio'):
         """
             If the token ends in 'in'
                 return 1
                 EX: kainin, lutuin, kapitin, etc.
         """
-        if token_str.endswith('in'):
+        if token_lower.endswith('in'):
             return "IN"
 
         """
@@ -361,12 +335,12 @@ def f_suffix_fil(tokens):
                 return "AN"
                 EX: palayan, puntahan, damitan, etc.
         """
-        if token_str.endswith('an'):
+        if token_lower.endswith('an'):
             return "AN"
 
     return "NONE"
 
-def f_eng_bigrams(token):
+def f_eng_bigrams(token_str, token_lower, t_len):
     """
     Filters tokens with ENG bigrams characteristics:
         th
@@ -377,14 +351,13 @@ def f_eng_bigrams(token):
         qu
         ion
     """
-    token_str = str(token).lower()
 
     """
         If the token contains 'th' in it
             return "TH"
             EX: the, mother, threatened, etc.
     """
-    if 'th' in token_str:
+    if 'th' in token_lower:
         return "TH"
 
     """
@@ -392,7 +365,7 @@ def f_eng_bigrams(token):
             return "SH"
             EX: shape, shrapnel, sheep, etc.
     """
-    if 'sh' in token_str:
+    if 'sh' in token_lower:
         return "SH"
 
     """
@@ -400,7 +373,7 @@ def f_eng_bigrams(token):
             return "CH"
             EX: church, chicken, child, etc.
     """
-    if 'ch' in token_str:
+    if 'ch' in token_lower:
         return "CH"
 
     """
@@ -408,7 +381,7 @@ def f_eng_bigrams(token):
             return "WH"
             EX: when, weather, which, etc.
     """
-    if 'wh' in token_str:
+    if 'wh' in token_lower:
         return "WH"
 
     """
@@ -416,7 +389,7 @@ def f_eng_bigrams(token):
             return "CK"
             EX: chicken, peck, duck, etc.
     """
-    if 'ck' in token_str:
+    if 'ck' in token_lower:
         return "CK"
 
     """
@@ -424,7 +397,7 @@ def f_eng_bigrams(token):
             return "QU"
             EX: quack, queen, quiz, etc.
     """
-    if 'qu' in token_str:
+    if 'qu' in token_lower:
         return "QU"
 
     """
@@ -432,12 +405,12 @@ def f_eng_bigrams(token):
             return "ION"
             EX: action, motion, emotion, etc.
     """
-    if 'ion' in token_str:
+    if 'ion' in token_lower:
         return "ION"
 
     return "NONE"
 
-def f_get_suffix_eng(token):
+def f_get_suffix_eng(token_str, token_lower, t_len):
     """
     Filters tokens with ENG suffixes characteristics:
         -tion
@@ -458,168 +431,45 @@ def f_get_suffix_eng(token):
         -s
         -y
     """
-    token_str = str(token).lower()
-    t_len = len(token_str)
-
-    # Filter for 4 width prefix
-    if t_len > 4:
-        """
-        If the token ends with 'tion'
-            return "TION"
-            EX: action, motion, emotion
-        """
-        if token_str.endswith('tion'):
-            return 'TION'
-
-        """
-        If the token ends with 'sion'
-            return "SION"
-            EX: precision, confusion, vision
-        """
-        if token_str.endswith('sion'):
-            return 'SION'
-
-        """
-        If the token ends with 'ment'
-            return "MENT"
-            EX: moment, payment, contentment
-        """
-        if token_str.endswith('ment'):
-            return 'MENT'
 
-        """
-        If the token ends with 'ness'
-            return "NESS"
-            EX: happiness, kindness, darkness
-        """
-        if token_str.endswith('ness'):
-            return 'NESS'
-
-        """
-        If the token ends with 'able'
-            return "ABLE"
-            EX: reachable, comfortable, doable
-        """
-        if token_str.endswith('able'):
-            return 'ABLE'
-
-        """
-        If the token ends with 'ible'
-            return "IBLE"
-            EX: visible, terrible, flexible
-        """
-        if token_str.endswith('ible'):
-            return 'IBLE'
-
-        """
-        If the token ends with 'less'
-            return "LESS"
-            EX: hopeless, useless, careless
-        """
-        if token_str.endswith('less'):
-            return 'LESS'
-
-    # Filter for 3 width prefix
-    if t_len > 3:
-        """
-        If the token ends with 'ing'
-            return "ING"
-            EX: walking, talking, coding
-        """
-        if token_str.endswith('ing'):
-            return 'ING'
-
-        """
-        If the token ends with 'ful'
-            return "FUL"
-            EX: beautiful, wonderful, painful
-        """
-        if token_str.endswith('ful'):
-            return 'FUL'
-
-        """
-        If the token ends with 'ity'
-            return "ITY"
-            EX: ability, flexibility, city
-        """
-        if token_str.endswith('ity'):
-            return 'ITY'
-
-        """
-        If the token ends with 'est'
-            return "EST"
-            EX: biggest, fastest, strongest
-        """
-        if token_str.endswith('est'):
-            return 'EST'
-
-    # Filter for 2 width prefix
-    if t_len > 2:
-        """
-        If the token ends with 'es'
-            return "ES"
-            EX: boxes, wishes, goes
-        """
-        # 'es' must be checked before 's'
-        if token_str.endswith('es'):
-            return 'ES'
-
-        """
-        If the token ends with 'ed'
-            return "ED"
-            EX: walked, talked, coded
-        """
-        if token_str.endswith('ed'):
-            return 'ED'
-
-        """
-        If the token ends with 'er'
-            return "ER"
-            EX: teacher, worker, faster
-        """
-        if token_str.endswith('er'):
-            return 'ER'
-
-        """
-        If the token ends with 'ly'
-            return "LY"
-            EX: quickly, slowly, happily
-        """
-        if token_str.endswith('ly'):
-            return 'LY'
-
-    # Filter for 1 width prefix
-    if t_len > 1:
-        """
-        If the token ends with 's' (and not 'es')
-            return "S"
-            EX: cats, dogs, runs
-        """
-        if token_str.endswith('s'):
-            return 'S'
-
-        """
-        If the token ends with 'y'
-            return "Y"
-            EX: happy, sleepy, party
-        """
-        if token_str.endswith('y'):
-            return 'Y'
+    """
+        For every suffix width in ENG_SUFFIXES, from the widest to the narrowest
+        If the token is longer than the width
+            Take the last 'width' letters of the token and look them up in the table
+            If they are a known suffix
+                return its label
+        EX: walking -> 'king' (not found), 'ing' (found) -> "ING"
+    """
+    for width, suffixes in ENG_SUFFIXES:
+        if t_len > width:
+            label = suffixes.get(token_lower[-width:])
+            if label is not None:
+                return label
 
     return 'NONE'
 
-def f_contains_letters_cfjqvxz(token):
+def f_contains_letters_cfjqvxz(token_str, token_lower, t_len):
     """
     If the token contains any of the letters: (c, f, j, q, v, x, z)
         return 1
         EX: cabbage, jacket, fairy, etc.
     """
-    token_str = str(token).lower()
-    if any(c in token_str for c in 'cfjqvxz'):
+    if not LOAN_LETTERS.isdisjoint(token_lower):
         return 1
     return 0
 
-def f_a_ratio(token):
+def _letters(token_lower):
+    """
+    Returns only the letters of a token, as a string
+    Most tokens are made of letters only, those are returned as is without
+    checking each character, otherwise the non-letters are filtered out
+    EX: kumain -> kumain, nag-aaral -> nagaaral, 100 -> ''
+    """
+    if token_lower.isalpha():
+        return token_lower
+    return ''.join(filter(str.isalpha, token_lower))
+
+def f_a_ratio(token_str, token_lower, t_len):
     """
     Take all the letters from a token and count the number of times 'a' repeats
     If the token does not contain letters
@@ -627,14 +477,13 @@ def f_a_ratio(token):
     Otherwise return the ratio of letter a's to all the letters
     Note: Filipino words use the letter 'a' the most
     """
-    token_str = str(token).lower()
-    letters = [c for c in token_str if c.isalpha()]
+    letters = _letters(token_lower)
     if not letters:
         return 0
     a_count = letters.count('a')
     return a_count / len(letters)
 
-def f_k_ratio(token):
+def f_k_ratio(token_str, token_lower, t_len):
     """
     Take all the letters from a token and count the number of times 'k' repeats
     If the token does not contain letters
@@ -642,14 +491,13 @@ def f_k_ratio(token):
     Otherwise return the ratio of letter k's to all the letters
     Note: Filipino words use the letter 'k' more compared to english
     """
-    token_str = str(token).lower()
-    letters = [c for c in token_str if c.isalpha()]
+    letters = _letters(token_lower)
     if not letters:
         return 0
-    a_count = letters.count('k')
-    return a_count / len(letters)
+    k_count = letters.count('k')
+    return k_count / len(letters)
 
-def f_e_ratio(token):
+def f_e_ratio(token_str, token_lower, t_len):
     """
     Take all the letters from a token and count the number of times 'e' repeats
     If the token does not contain letters
@@ -657,21 +505,21 @@ def f_e_ratio(token):
     Otherwise return the ratio of letter e's to all the letters
     Note: English words use the letter 'e' the most
     """
-    token_str = str(token).lower()
-    letters = [c for c in token_str if c.isalpha()]
+    letters = _letters(token_lower)
     if not letters:
         return 0
-    a_count = letters.count('e')
-    return a_count / len(letters)
+    e_count = letters.count('e')
+    return e_count / len(letters)
 
-def f_vowel_consonant_ratio(token):
+def f_vowel_consonant_ratio(token_str, token_lower, t_len):
     """
     Get all the letters of the token
     If there are no letters
         return 0
 
-    Loop through the letters list
-    If it's a vowel, increment v_count, else, increment v_count
+    Loop through the letters
+    If it's a vowel, increment v_count
+    Every letter that is not a vowel is a consonant, so c_count = number of letters - v_count
     If there are no consonants
         return 100
 
@@ -679,117 +527,219 @@ def f_vowel_consonant_ratio(token):
     Note: Filipino words have a ratio closer to 1.0
     EX: pupunta = 0.75, isipin = 1.0, string = 0.2, university = 0.6
     """
-    token_str = str(token).lower()
     v_count = 0
-    c_count = 0
-    letters = [c for c in token_str if c.isalpha()]
+    letters = _letters(token_lower)
 
     if not letters:
         return 0
     for c in letters:
-        if c in 'aeiou':
+        if c in VOWELS:
             v_count += 1
-        else:
-            c_count += 1
+    c_count = len(letters) - v_count
     if c_count == 0:
         return 100
     return v_count / c_count
 
-def f_has_consonant_cluster(token):
+def f_has_consonant_cluster(token_str, token_lower, t_len):
     """
-    consonant_pattern = match everything that is not:
+    _RE_CONSONANT_CLUSTER = match everything that is not:
         ('aeiou', backslash d = '0-9', backslash W = all symbols, '_')
         3 times in a row, or 3 consonants in a row
     If the patter exists in the token
         return 1
+    Only tokens with at least 3 letters can have a cluster, so shorter tokens skip the regex
     """
-    token_str = str(token).lower()
-    consonant_pattern = r'[^aeiou\d\W_]{3,}'
-
-    if re.search(consonant_pattern, token_str):
+    if t_len > 2 and _RE_CONSONANT_CLUSTER.search(token_lower):
         return 1
     return 0
 
-def f_is_capitalized_mid_sentence(token, index, tokens):
+def f_is_capitalized_mid_sentence(token_strs):
     """
-    Test if the token is a capitalized mid-sentence word (Named-Entity)
+    Test if each token is a capitalized mid-sentence word (Named-Entity)
+    Unlike the other features, this takes the whole list of tokens and returns the whole column
     If The first letter is not capitalized
-        return 0
+        0
     If it is the first token of the list
-        return 0
+        0
     If the previous token is a sentence ender symbol
-        return 0
-    otherwise, return 1
+        0
+    otherwise, 1
     """
-    token_str = str(token)
-    if not token_str[0].isupper():
-        return 0
-    if index == 0:
-        return 0
-    prev_token = str(tokens[index - 1])
-    if prev_token in ('.', '!', '?'):
-        return 0
-    return 1
+    n_tokens = len(token_strs)
+
+    # Whether the first letter of each token is capitalized
+    is_capitalized = np.fromiter((token_str[0].isupper() for token_str in token_strs), dtype=bool, count=n_tokens)
 
-def f_first_letter_ascii(token):
+    """
+        A token starts a sentence if it is the first token of the list,
+        or the token before it is a sentence ender symbol
+        EX: ['Ang', 'aso', '.', 'Si', 'Juan'] -> [True, False, False, True, False]
+    """
+    starts_sentence = np.ones(n_tokens, dtype=bool)
+    starts_sentence[1:] = np.isin(np.array(token_strs[:-1], dtype=object), SENTENCE_ENDERS)
+
+    return (is_capitalized & ~starts_sentence).astype(np.int8)
+
+def f_first_letter_ascii(token_str, token_lower, t_len):
     """
     Returns the ASCII value of the first letter of the token.
     """
-    return ord(token[0])
+    return ord(token_str[0])
 
-def f_last_letter_ascii(token):
+def f_last_letter_ascii(token_str, token_lower, t_len):
     """
     Returns the ASCII value of the last letter of the token.
     """
-    return ord(token[-1])
+    return ord(token_str[-1])
+
+# Features that only need the token itself, in column order
+TOKEN_ONLY_FEATURES = [
+    f_get_language,
+    f_oth_filter,
+    f_has_pair_vowel_word_duplication,
+    f_prefix_fil,
+    f_infix_fil,
+    f_suffix_fil,
+    f_eng_bigrams,
+    f_get_suffix_eng,
+    f_contains_letters_cfjqvxz,
+    f_a_ratio,
+    f_k_ratio,
+    f_e_ratio,
+    f_vowel_consonant_ratio,
+    f_has_consonant_cluster,
+    f_first_letter_ascii,
+    f_last_letter_ascii
+]
+
+# Features that also need the tokens around each token, these take the whole list of tokens
+CONTEXTUAL_FEATURES = [
+    f_is_capitalized_mid_sentence
+]
+
+# Names of the columns of the feature matrix, in order
+FEATURE_NAMES = [func.__name__ for func in TOKEN_ONLY_FEATURES + CONTEXTUAL_FEATURES]
 
-def extract_features(tokens: List[str]) -> pd.DataFrame:
+"""
+The features that return a string value, with every label they can return
+These columns are stored as pandas Categoricals (one small integer code per token),
+and have to be encoded before training or predicting
+"""
+FEATURE_CATEGORIES = {
+    'f_get_language': ['NONE', 'ENG', 'FIL'],
+    'f_oth_filter': ['REGULAR', 'NUMERIC', 'SYMBOL', 'LAUGHTER', 'ABB'],
+    'f_has_pair_vowel_word_duplication': ['NO_dupe', 'WORD_dupe', 'PAIR_dupe', 'VOWEL_dupe'],
+    'f_prefix_fil': ['NONE', 'MAKI', 'PAKI', 'NAKI', 'PALA', 'MALA', 'PANG', 'MAG', 'NAG', 'PAG',
+                     'UM', 'IN', 'NI', 'MA', 'PA', 'NA', 'NG'],
+    'f_infix_fil': ['NONE', 'IN', 'UM', 'NG'],
+    'f_suffix_fil': ['NONE', 'IN', 'AN'],
+    'f_eng_bigrams': ['NONE', 'TH', 'SH', 'CH', 'WH', 'CK', 'QU', 'ION'],
+    'f_get_suffix_eng': ['NONE'] + [label for _, suffixes in ENG_SUFFIXES for label in suffixes.values()]
+}
+CATEGORICAL_COLS = list(FEATURE_CATEGORIES)
+
+# pandas types of the categorical features, created once so every call can reuse them
+_CATEGORY_DTYPES = {col: pd.CategoricalDtype(categories) for col, categories in FEATURE_CATEGORIES.items()}
+
+# NumPy type of each column, categorical features are stored as int8 codes
+COLUMN_DTYPES = {
+    f_contains_letters_cfjqvxz: np.int8,
+    f_a_ratio: np.float32,
+    f_k_ratio: np.float32,
+    f_e_ratio: np.float32,
+    f_vowel_consonant_ratio: np.float32,
+    f_has_consonant_cluster: np.int8,
+    f_first_letter_ascii: np.int32,
+    f_last_letter_ascii: np.int32,
+    f_is_capitalized_mid_sentence: np.int8
+}
+
+# For every token-only feature, a {label: code} dictionary if it is categorical, otherwise None
+_CATEGORY_CODES = [
+    {label: code for code, label in enumerate(FEATURE_CATEGORIES[func.__name__])}
+    if func.__name__ in FEATURE_CATEGORIES else None
+    for func in TOKEN_ONLY_FEATURES
+]
+
+# Maximum number of unique tokens whose token-only features are kept between calls
+FEATURE_CACHE_SIZE = 100000
+
+@lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def _token_only_features(token_str):
+    """
+    Computes all the token-only features of a single token and returns them as a tuple,
+    in the same order as TOKEN_ONLY_FEATURES
+
+    The token is lowercased once and shared by all the feature functions
+    Results are cached on the token itself (not its lowercase form, since some features
+    depend on capitalization), so words that repeat, like 'ang', 'the' or '.',
+    are only computed once
+    Labels of categorical features are stored as their code in FEATURE_CATEGORIES
+    """
+    token_lower = token_str.lower()
+    t_len = len(token_lower)
+    return tuple([
+        func(token_str, token_lower, t_len) if codes is None else codes[func(token_str, token_lower, t_len)]
+        for func, codes in zip(TOKEN_ONLY_FEATURES, _CATEGORY_CODES)
+    ])
+
+def extract_features(tokens: List[str], return_array: bool = False):
     """
     Takes a list of tokens and converts it into a feature matrix.
 
     It returns a dataframe (2d array) where each row is a token and each column is a feature.
+
+    If return_array is True, a float32 NumPy matrix with the columns in FEATURE_NAMES's order
+    is returned instead, without building the DataFrame. Its categorical features hold the
+    position of each label in FEATURE_CATEGORIES instead of the label itself.
+    """
+    token_strs = [str(token) for token in tokens]
+
     """
-    token_only_features = [
-        f_get_language,
-        f_oth_filter,
-        f_has_pair_vowel_word_duplication,
-        f_prefix_fil,
-        f_infix_fil,
-        f_suffix_fil,
-        f_eng_bigrams,
-        f_get_suffix_eng,
-        f_contains_letters_cfjqvxz,
-        f_a_ratio,
-        f_k_ratio,
-        f_e_ratio,
-        f_vowel_consonant_ratio,
-        f_has_consonant_cluster,
-        f_first_letter_ascii,
-        f_last_letter_ascii
-    ]
-
-    contextual_features = [
-        f_is_capitalized_mid_sentence
-    ]
-
-    """
-    Create a features list to store features temporarily
-    For every token, a temporary features list will contain the returns of:
-        token only features, and contextual_features (need index i) 
-        It will then append the features list for the single token to the all_features_list
-    Convert the all_features_list into a dataframe (feature matrix), then return it
-    """
-    all_features_list = []
-
-    for i, token in enumerate(tokens):
-        features = {}
-
-        for func in token_only_features:
-            features[func.__name__] = func(token)
-        for func in contextual_features:
-            features[func.__name__] = func(token, i, tokens)
-
-        all_features_list.append(features)
-
-    X = pd.DataFrame(all_features_list)
-    return X
\ No newline at end of file
+    Allocate one typed array per feature, then fill the feature matrix one column at a time
+    The token-only features of each token come from the cache, and are split into columns,
+    the contextual features compute their whole column from the full token list at once
+    All columns are then handed to the DataFrame constructor at once without copying,
+    instead of building a dictionary for every token
+    """
+    n_tokens = len(token_strs)
+    columns = {
+        func.__name__: np.empty(n_tokens, dtype=COLUMN_DTYPES.get(func, np.int8))
+        for func in TOKEN_ONLY_FEATURES + CONTEXTUAL_FEATURES
+    }
+
+    """
+    Words like 'ang', 'the' or '.' repeat a lot in the same list of tokens,
+    so the token-only features are only computed once for every unique token
+    (in the order they first appear), then copied to every token
+    """
+    unique_tokens = list(dict.fromkeys(token_strs))
+    n_unique = len(unique_tokens)
+    unique_rows = list(map(_token_only_features, unique_tokens))
+
+    """
+    Split the rows of the unique tokens into typed columns (read straight into a typed array with fromiter,
+    without NumPy having to inspect the values first), then spread every column
+    to all the tokens at once with a NumPy gather (take) on the index of each token's unique token
+    EX: ['ang', 'aso', 'ang'] -> unique ['ang', 'aso'], index [0, 1, 0]
+    """
+    unique_index = {token_str: i for i, token_str in enumerate(unique_tokens)}
+    token_index = np.fromiter(map(unique_index.__getitem__, token_strs), dtype=np.intp, count=n_tokens)
+    for func, values in zip(TOKEN_ONLY_FEATURES, zip(*unique_rows)):
+        unique_values = np.fromiter(values, dtype=columns[func.__name__].dtype, count=n_unique)
+        np.take(unique_values, token_index, out=columns[func.__name__])
+    for func in CONTEXTUAL_FEATURES:
+        columns[func.__name__][:] = func(token_strs)
+
+    if return_array:
+        X = np.empty((n_tokens, len(columns)), dtype=np.float32)
+        for i, column in enumerate(columns.values()):
+            X[:, i] = column
+        return X
+
+    # Wrap the codes of the categorical features with their labels
+    for col, dtype in _CATEGORY_DTYPES.items():
+        columns[col] = pd.Categorical.from_codes(columns[col], dtype=dtype)
+
+    X = pd.DataFrame(columns, copy=False)
+    return X
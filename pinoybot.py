@@ -6,13 +6,16 @@ handles other modules and classifies each word with a
 
 import os
 import pickle
+import sys
+from itertools import accumulate
+import numpy as np
 from typing import List
 import feature_extractor as fe
 
 MODEL_FILENAME = 'pinoybot_model_f1_validated_depth_11.pkl'
 ENCODER_FILENAME = 'pinoybot_encoder_depth_11.pkl'
 
-# List of features in the same order as the model
+# List of features in the same order as the model, used if the model does not record the features it was trained with
 FEATURE_COLS = [
     'f_get_language',
     'f_oth_filter',
@@ -33,68 +36,236 @@ FEATURE_COLS = [
     'f_is_capitalized_mid_sentence'
 ]
 
-# The list of features that return a string value
-CATEGORICAL_COLS = [
-    'f_get_language',
-    'f_oth_filter',
-    'f_has_pair_vowel_word_duplication',
-    'f_prefix_fil',
-    'f_infix_fil',
-    'f_suffix_fil',
-    'f_eng_bigrams',
-    'f_get_suffix_eng'
-]
+# The list of features that return a string value, defined once in the feature extractor
+CATEGORICAL_COLS = fe.CATEGORICAL_COLS
+
+def _feature_positions(cols):
+    """
+    Looks up the position of every column the model uses in the extractor's output, once instead of on every call
+    Returns None if the extractor already produces exactly those columns in the same order (no reordering needed)
+    """
+    missing_cols = [col for col in cols if col not in fe.FEATURE_NAMES]
+    if missing_cols:
+        raise ValueError(f"[Error: Extractor is missing features required by the model: {missing_cols}]")
+    positions = [fe.FEATURE_NAMES.index(col) for col in cols]
+    if positions == list(range(len(fe.FEATURE_NAMES))):
+        return None
+    return positions
+
+# Positions of FEATURE_COLS, replaced by the trained model's own features once it is loaded
+_FEATURE_POSITIONS = _feature_positions(FEATURE_COLS)
+
+# Position of the categorical features and the capitalized mid-sentence feature in the extractor's output
+_CATEGORICAL_POSITIONS = [fe.FEATURE_NAMES.index(col) for col in CATEGORICAL_COLS]
+_CAPITALIZED_POSITION = fe.FEATURE_NAMES.index('f_is_capitalized_mid_sentence')
+
+# Maximum number of (token, capitalized mid-sentence) predictions kept between calls
+PREDICTION_CACHE_SIZE = 100000
+
+# Tag given to every token when the features cannot be encoded or predicted
+_OTH = sys.intern('OTH')
 
 # Global variables
 _MODEL = None
 _ENCODER = None
-_EXTRACTOR = fe
+_CATEGORY_MAPS = None
+_TREE = None
+_PREDICTIONS = {}
 
-def tag_language(tokens: List[str]) -> List[str]:
+def _load_pickle(filename, description):
     """
-    Tags each token in the input list with its predicted language
+    Loads a pickled object from a file, if the file cannot be found, display error
+    """
+    if not os.path.exists(filename):
+        raise FileNotFoundError(f"[{description} file '{filename}' not found]")
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+def _build_category_maps(encoder):
+    """
+    Builds a lookup array for every categorical feature, from the extractor's category code
+    to the number the encoder gives the same label (or its unknown value if it never saw it)
+    EX: extractor ['NONE', 'ENG', 'FIL'], encoder ['ENG', 'FIL', 'NONE'] -> [2, 0, 1]
+    """
+    unknown_value = getattr(encoder, 'unknown_value', None)
+    category_maps = {}
+    for col, encoder_labels in zip(CATEGORICAL_COLS, encoder.categories_):
+        encoder_codes = {label: code for code, label in enumerate(encoder_labels)}
+        codes = []
+        for label in fe.FEATURE_CATEGORIES[col]:
+            if label in encoder_codes:
+                codes.append(encoder_codes[label])
+            elif unknown_value is not None:
+                codes.append(unknown_value)
+            else:
+                raise ValueError(f"[Encoder has no category for '{label}' in {col}]")
+        category_maps[col] = np.array(codes, dtype=np.float32)
+    return category_maps
+
+def _build_tree_arrays(model):
     """
-    global _MODEL, _ENCODER
+    Flattens the trained decision tree into the NumPy arrays used by _predict:
+        the feature and float32 threshold each node compares, its 2 children (left then right),
+        the tag each node predicts, and the depth of the tree
+    Leaves are made to point back to themselves, so every row can take the same number of steps
+    """
+    tree = model.tree_
+    nodes = np.arange(tree.node_count)
+    is_leaf = tree.children_left == -1
+    feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+    threshold = np.where(is_leaf, 0.0, tree.threshold)
+
+    # The features are float32, so each threshold is rounded down to the largest float32 not above it,
+    # a float32 value is above the rounded threshold exactly when it is above the original one
+    threshold_32 = threshold.astype(np.float32)
+    rounded_up = threshold_32 > threshold
+    threshold_32[rounded_up] = np.nextafter(threshold_32[rounded_up], np.float32(-np.inf))
+    children = np.stack([np.where(is_leaf, nodes, tree.children_left),
+                         np.where(is_leaf, nodes, tree.children_right)], axis=1).ravel()
+    labels = model.classes_[tree.value[:, 0].argmax(axis=1)]
+    return feature, threshold_32, children, labels, tree.max_depth
+
+def _predict(X):
+    """
+    Predicts the tag of every row of the feature matrix, giving the same tags as the model's predict
 
-    # Load the trained decision tree model, if cannot be found, display error
+    Instead of walking the tree one row at a time, all rows take one step down the tree together,
+    going to a node's right child if their value for the node's feature is above its threshold
+    EX: with 2 rows at node 0 [0, 0], after the 1st step they could be at [1, 8]
+    """
+    feature, threshold, children, labels, depth = _TREE
+    n_rows, n_cols = X.shape
+    values = X.ravel()
+    row_starts = np.arange(0, n_rows * n_cols, n_cols)
+    node = np.zeros(n_rows, dtype=np.intp)
+    for _ in range(depth):
+        node = children[2 * node + (values[row_starts + feature[node]] > threshold[node])]
+    return labels[node]
+
+def load_model():
+    """
+    Loads the trained decision tree model and the feature encoder into the global variables
+    Does nothing if they are already loaded
+
+    tag_language calls this on its first use, a long-running program (like a server)
+    can call it once at startup so the first request does not have to wait for it
+    """
+    global _MODEL, _ENCODER, _CATEGORY_MAPS, _TREE, _FEATURE_POSITIONS
+
+    # Load the trained decision tree model
     if _MODEL is None:
-        if not os.path.exists(MODEL_FILENAME):
-            raise FileNotFoundError(f"[Model file '{MODEL_FILENAME}' not found]")
-        with open(MODEL_FILENAME, 'rb') as f:
-            _MODEL = pickle.load(f)
+        model = _load_pickle(MODEL_FILENAME, "Model")
+
+        """
+        The features the model was trained with (which can be fewer than FEATURE_COLS,
+        if train_model.py dropped unused ones) are looked up in the extractor's output
+        once here, instead of on every prediction
+        """
+        model_cols = getattr(model, 'feature_names_in_', None)
+        if model_cols is not None:
+            _FEATURE_POSITIONS = _feature_positions(list(model_cols))
+        _TREE = _build_tree_arrays(model)
+        _MODEL = model
 
-    # Load the feature encoder, if cannot be found, display error
+    # Load the feature encoder, its feature names are checked once the same way as the model's
     if _ENCODER is None:
-        if not os.path.exists(ENCODER_FILENAME):
-            raise FileNotFoundError(f"[Encoder file '{ENCODER_FILENAME}' not found]")
-        with open(ENCODER_FILENAME, 'rb') as f:
-            _ENCODER = pickle.load(f)
+        encoder = _load_pickle(ENCODER_FILENAME, "Encoder")
+        encoder_cols = getattr(encoder, 'feature_names_in_', None)
+        if encoder_cols is not None and list(encoder_cols) != CATEGORICAL_COLS:
+            raise ValueError(f"[Encoder was trained on different features: {list(encoder_cols)}]")
+        _CATEGORY_MAPS = _build_category_maps(encoder)
+        _ENCODER = encoder
+
+def tag_language(tokens: List[str]) -> List[str]:
+    """
+    Tags each token in the input list with its predicted language
+    """
+    return _tag_tokens(tokens)
+
+def tag_language_batch(token_lists: List[List[str]]) -> List[List[str]]:
+    """
+    Tags several lists of tokens (like every sentence of a document) at once, returns a list of tags for each list
+    Every list is tagged the same as if it was given to tag_language on its own,
+    but all of their tokens go through the feature extractor and the model together
+    """
+    tokens = [token for token_list in token_lists for token in token_list]
+    if not tokens:
+        return [[] for _ in token_lists]
+
+    list_ends = list(accumulate(len(token_list) for token_list in token_lists))
+    list_starts = [0] + list_ends[:-1]
+
+    # Empty lists at the end start past the last token, so only the starts of lists with tokens are marked
+    tags = _tag_tokens(tokens, [start for start in list_starts if start < len(tokens)])
+    return [tags[start:end] for start, end in zip(list_starts, list_ends)]
 
-    # Converts the raw data into a feature matrix (DataFrame with rows as each token and column as each feature)
-    df_features = fe.extract_features(tokens)
+def _tag_tokens(tokens, list_starts=None):
+    """
+    Tags each token with its predicted language, if list_starts is given, the tokens are several
+    lists joined together and list_starts is the index where each list begins
+    """
+    load_model()
+
+    # Converts the raw data into a feature matrix (float32 NumPy array with rows as each token and column as each feature)
+    X = fe.extract_features(tokens, return_array=True)
+
+    # The first token of every list starts a sentence, so it is never capitalized mid-sentence,
+    # even if the list before it did not end with a punctuation mark
+    if list_starts:
+        X[list_starts, _CAPITALIZED_POSITION] = 0
+
+    """
+    The prediction for a token only depends on the token itself, and whether it is capitalized mid-sentence
+    (the only contextual feature), so predictions are cached on those two values across calls
+    Only the rows of tokens that were never seen before (once per unique pair) are encoded and
+    given to the model, the model is skipped entirely if every token has been seen before
+    """
+    keys = list(zip(map(str, tokens), X[:, _CAPITALIZED_POSITION].tolist()))
+    tags = [_PREDICTIONS.get(key) for key in keys]
+    new_rows = {}
+    for i, (key, tag) in enumerate(zip(keys, tags)):
+        if tag is None:
+            new_rows.setdefault(key, i)
+    if not new_rows:
+        return tags
+    # If every token is new and unique, the extractor's matrix is used as is without selecting its rows
+    if len(new_rows) < len(keys):
+        X = X[list(new_rows.values())]
 
-    # Encode categorical features into numbers that the model can use
+    """
+    Encode categorical features into numbers that the model can use, in place since the labels are not needed after
+    The extractor's categorical columns already hold a code for each label, so they are encoded
+    by looking those codes up in the arrays built from the encoder's categories at load time,
+    which gives the same numbers as _ENCODER.transform without comparing any strings
+    """
     try:
-        df_features_encoded = df_features.copy()
-        df_features_encoded[CATEGORICAL_COLS] = _ENCODER.transform(df_features[CATEGORICAL_COLS])
+        for col, position in zip(CATEGORICAL_COLS, _CATEGORICAL_POSITIONS):
+            X[:, position] = _CATEGORY_MAPS[col][X[:, position].astype(np.intp)]
     except Exception as e:
         print(f"[Error: Failed to encode features. {e}]")
-        return ['OTH'] * len(tokens)
+        return [_OTH] * len(tokens)
 
-    # Reorder DataFrame columns to match FEATURE_COLS's order
-    try:
-        df_features_final = df_features_encoded[FEATURE_COLS]
-    except KeyError as e:
-        print(f"[Error: Extractor is missing features required by the model: {e}]")
-        return ['OTH'] * len(tokens)
+    # Select and reorder the columns to match the model's features, by position (only if the extractor's differ)
+    if _FEATURE_POSITIONS is not None:
+        X = X[:, _FEATURE_POSITIONS]
 
-    # Predict the language of each string using the trained model
+    # Predict the language of each new token using the trained model's tree
     try:
-        predictions = _MODEL.predict(df_features_final)
-        return list(predictions)
+        predictions = _predict(X)
     except Exception as e:
         print(f"[Error: {e}]")
-        return ['OTH'] * len(tokens)
+        return [_OTH] * len(tokens)
+
+    """
+    Cache the new predictions (start over if the cache is full), and fill in the missing tags
+    The missing tags are filled from this call's own predictions, not from the cache,
+    so another thread clearing the cache at the same time cannot lose them
+    """
+    new_tags = dict(zip(new_rows, predictions.tolist()))
+    if len(_PREDICTIONS) + len(new_tags) > PREDICTION_CACHE_SIZE:
+        _PREDICTIONS.clear()
+    _PREDICTIONS.update(new_tags)
+    return [tag if tag is not None else new_tags[key] for key, tag in zip(keys, tags)]
 
 # Tester
 if __name__ == "__main__":
@@ -104,5 +275,12 @@ if __name__ == "__main__":
     try:
         tags = tag_language(example_tokens)
         print(f"Tags:   {tags}")
+
+        # Batches have to give the same tags as tagging each list alone, including empty lists (also at the end)
+        example_batches = [[], [[]], [example_tokens, []], [[], example_tokens[:2], [], example_tokens[2:], []]]
+        for token_lists in example_batches:
+            batch_tags = tag_language_batch(token_lists)
+            assert batch_tags == [tag_language(token_list) for token_list in token_lists], token_lists
+        print(f"Batch tags: {batch_tags}")
     except Exception as e:
         print(e)
\ No newline at end of file
@@ -1,13 +1,13 @@
+import os
 import pandas as pd
 import pickle
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OrdinalEncoder
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.metrics import classification_report
-from feature_extractor import extract_features
+from feature_extractor import extract_features, CATEGORICAL_COLS
 from sklearn.metrics import f1_score
-from sklearn.tree import plot_tree
-import matplotlib.pyplot as plt
 
 """
 Annotations are labeled as 'FIL', 'ENG', or 'OTH'
@@ -36,7 +36,7 @@ df_clean = df[['word', 'label']].dropna() # removes any nulls
 raw_word = df_clean['word']
 
 print("Mapping labels to FIL, ENG, OTH...")
-y = df_clean['label'].apply(map_labels)  # categorizing labels as FIL, ENG, or OTH
+y = pd.Series([map_labels(label) for label in df_clean['label']], index=df_clean.index, name='label')  # categorizing labels as FIL, ENG, or OTH
 
 print(f"Loaded and cleaned {len(df_clean)} data points.")
 print("New label distribution:")
@@ -48,34 +48,13 @@ print("Extracting features...")
 print(f"Features extracted. Shape: {word_features.shape}")
 
 # List of columns that return strings
-categorical_cols = [
-    'f_get_language',
-    'f_oth_filter',
-    'f_has_pair_vowel_word_duplication',
-    'f_prefix_fil',
-    'f_infix_fil',
-    'f_suffix_fil',
-    'f_eng_bigrams',
-    'f_get_suffix_eng'
-]
-
-print("Encoding categorical features...")
-
-# 2. Make a copy to work on
-word_features_encoded = word_features.copy()
-
-# Convert categorical features into numbers, unknown val prevents errors
-encoder = OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=-1)
-
-# Fit the encoder and transform the data
-word_features_encoded[categorical_cols] = encoder.fit_transform(word_features[categorical_cols])
-print("Encoding done.")
+categorical_cols = CATEGORICAL_COLS
 
 # split data
 print("Splitting data (70-15-15)...")
 
 X_train, X_temp, y_train, y_temp = train_test_split(
-    word_features_encoded, y,
+    word_features, y,
     test_size = 0.30,
     random_state = 42,
     stratify = y
@@ -91,18 +70,43 @@ print(f"Train samples: {len(X_train)}")
 print(f"Validation samples: {len(X_val)}")
 print(f"Test samples: {len(X_test)}")
 
+print("Encoding categorical features...")
+
+# Number each category by how often it appears in the training set (most common first) instead of alphabetically,
+# so the tree can split the common labels from the rare ones with fewer thresholds
+# Categories that never appear in the training set are still listed, after all the others
+category_order = [X_train[col].value_counts().index.astype(str).tolist() for col in categorical_cols]
+
+# Convert categorical features into numbers, unknown val prevents errors
+encoder = OrdinalEncoder(categories=category_order, handle_unknown='use_encoded_value', unknown_value=-1)
+
+# Fit the encoder on the training set and transform every set, in place since the labels are not needed after
+X_train[categorical_cols] = encoder.fit_transform(X_train[categorical_cols])
+X_val[categorical_cols] = encoder.transform(X_val[categorical_cols])
+X_test[categorical_cols] = encoder.transform(X_test[categorical_cols])
+print("Encoding done.")
+
 print("\n--- Tuning Model with Validation Set (using Macro F1-score) ---")
 possible_depths = [6,7,8,9,10,11]
-best_depth = None
-best_val_score = 0.0
-for depth in possible_depths:
-    print(f"Testing max_depth = {depth}...")
 
+def validation_score(depth):
+    """
+    Trains a tree with the given max_depth and returns its Macro F1 on the validation set
+    """
     model_to_tune = DecisionTreeClassifier(random_state=42, max_depth=depth)
     model_to_tune.fit(X_train, y_train)
     y_val_pred = model_to_tune.predict(X_val)
+    return f1_score(y_val, y_val_pred, average='macro')
+
+# Every depth is trained independently, so they are trained at the same time in threads
+# (sklearn releases the GIL while building a tree), the scores come back in the same order
+with ThreadPoolExecutor(max_workers=min(len(possible_depths), os.cpu_count() or 1)) as executor:
+    val_scores = list(executor.map(validation_score, possible_depths))
 
-    val_score = f1_score(y_val, y_val_pred, average='macro')
+best_depth = None
+best_val_score = 0.0
+for depth, val_score in zip(possible_depths, val_scores):
+    print(f"Testing max_depth = {depth}...")
     print(f"  Validation Macro F1: {val_score:.4f}")
 
     if val_score > best_val_score: #save the best score
@@ -117,17 +121,38 @@ final_model = DecisionTreeClassifier(random_state=42, max_depth=best_depth)
 final_model.fit(X_train, y_train)
 print("Model training complete")
 
-# Generate an image of our decision tree
-print("Generating decision tree...")
-plt.figure(figsize=(200, 50))
-plot_tree(final_model,
-          feature_names=word_features.columns.tolist(),
-          class_names=final_model.classes_,
-          filled=True,
-          rounded=True,
-          fontsize=6,)
-plt.savefig('decision_tree.png', dpi=300)
-print("Saved decision tree image to 'decision_tree.png'")
+# Drop the features the tree (almost) never splits on and retrain without them,
+# the saved model remembers which features it uses, so pinoybot only gives it those
+min_importance = 1e-4
+kept_features = [feature for feature, importance in zip(X_train.columns, final_model.feature_importances_)
+                 if importance > min_importance]
+if len(kept_features) < X_train.shape[1]:
+    print(f"Dropping unused features: {[feature for feature in X_train.columns if feature not in kept_features]}")
+    X_train, X_val, X_test = X_train[kept_features], X_val[kept_features], X_test[kept_features]
+    final_model = DecisionTreeClassifier(random_state=42, max_depth=best_depth)
+    final_model.fit(X_train, y_train)
+    print("Model retrained on the remaining features")
+
+"""
+Generate an image of our decision tree, only if the PLOT_TREE environment variable is set (EX: PLOT_TREE=1)
+The image is 60000x15000 pixels, so drawing it takes most of the time and memory of a training run
+"""
+if os.environ.get('PLOT_TREE'):
+    from sklearn.tree import plot_tree
+    import matplotlib.pyplot as plt
+
+    print("Generating decision tree...")
+    plt.figure(figsize=(200, 50))
+    plot_tree(final_model,
+              feature_names=X_train.columns.tolist(),
+              class_names=final_model.classes_,
+              filled=True,
+              rounded=True,
+              fontsize=6,)
+    plt.savefig('decision_tree.png', dpi=300)
+    print("Saved decision tree image to 'decision_tree.png'")
+else:
+    print("Skipping the decision tree image (set PLOT_TREE=1 to generate it)")
 
 print("\n--- Final Evaluation on Test Set ---")
 y_pred = final_model.predict(X_test)
@@ -136,7 +161,7 @@ print(report)
 
 print("\n--- Feature Importance Report ---")
 
-feature_names = word_features.columns.tolist()
+feature_names = X_train.columns.tolist()
 importances = final_model.feature_importances_
 importance_df = pd.DataFrame({
     'Feature': feature_names,